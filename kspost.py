@@ -1,7 +1,18 @@
 #!/usr/bin/env python
+from multiprocessing.pool import ThreadPool
 from datetime import datetime
+import multiprocessing
+import argparse
+import errno
+import logging
 import shutil
+import subprocess
+import threading
+import socket
+import time
 import json
+import sys
+import os
 import re
 
 """
@@ -18,6 +29,17 @@ __version__ = '1.0.1'
 # Settings Begin ##############################################################
 DEBUG = False
 
+# Number of post tasks run concurrently (see post_tasks)
+post_workers = 4
+
+# Installed system root and location of the %pre script configuration files.
+# Offline mode (kspost.py SYSROOT[:CONFIG_DIR] ...) sets both per image.
+sysroot = '/mnt/sysimage'
+config_dir = '/tmp'
+# Set by offline mode: tasks whose input files are missing from the image
+# (ie: no /etc/default/grub in a container image) are not applicable
+offline_mode = False
+
 # List of additional grub parameters
 grub_param = ['net.ifnames=0', 'biosdevname=0']
 
@@ -37,43 +59,164 @@ NM_CONTROLLED=no
 resolv_tpl = """# Generated by ksconfig on {date}
 domain {domain}
 search {searchdomain}
-nameserver {primedns}
-nameserver {secondns}
+{nameservers}
+{options}
+"""
+
+# resolv.conf options in order: True = flag, value = option:value,
+# None/False = omitted. rotate is only used with more than one nameserver.
+resolv_options = [('timeout', 1),
+                  ('attempts', 2),
+                  ('rotate', True),
+                  ('single-request-reopen', True)]
+
+# Local caching resolver (dnsmasq) forwarding to the primary and secondary
+# DNS, resolv.conf then points at 127.0.0.1. Requires dnsmasq in %packages,
+# resolv.conf uses the DNS servers directly when it is not installed.
+dns_cache = True
+# Cache settings per location domain, 'default' for unlisted domains
+dns_cache_settings = {
+    'default': {'cache_size': 10000, 'neg_ttl': 60},
+    # 'location1.example.com': {'cache_size': 20000, 'neg_ttl': 30},
+}
+
+# /etc/dnsmasq.d/ksconfig.conf Template
+dnsmasq_tpl = """# Generated by ksconfig on {date}
+listen-address=127.0.0.1
+bind-interfaces
+no-resolv
+domain-needed
+{servers}
+cache-size={cache_size}
+neg-ttl={neg_ttl}
+"""
+
+# Hugepage reservation (sysctl.d) Template
+sysctl_tpl = """# Generated by ksconfig on {date}
+vm.nr_hugepages = {count}
+"""
+
+# Per NUMA node hugepage reservation (tmpfiles.d) Template
+hugepage_node_tpl = "w /sys/devices/system/node/node{node}/hugepages/" \
+                    "hugepages-{size_kb}kB/nr_hugepages - - - - {count}\n"
+
+# /etc/sysconfig/cpupower Template (host profile cpufreq governor)
+cpupower_tpl = """# Generated by ksconfig on {date}
+CPUPOWER_START_OPTS="frequency-set -g {governor}"
+CPUPOWER_STOP_OPTS="frequency-set -g ondemand"
+"""
+
+# /etc/multipath.conf Template (installs on a multipath LUN only)
+multipath_tpl = """# Generated by ksconfig on {date}
+defaults {{
+    user_friendly_names yes
+    find_multipaths yes
+    path_grouping_policy multibus
+    path_selector "round-robin 0"
+    failback immediate
+}}
+
+# Per LUN settings, these take precedence over the built-in array defaults
+multipaths {{
+{multipaths}}}
+"""
+multipath_lun_tpl = """    multipath {{
+        wwid {wwid}
+        alias {name}
+        path_grouping_policy multibus
+        path_selector "round-robin 0"
+    }}
+"""
 
+# Local package mirrors per location domain, 'default' for unlisted domains.
+# Mirrors are ranked by TCP connect latency, the name lookup and the connect
+# are each limited to mirror_timeout seconds, and yum_repo_file is replaced with repositories using them in that order.
+# An empty list leaves the yum configuration unchanged.
+yum_mirrors = {
+    'default': [],
+    # 'location1.example.com': ['http://mirror1.location1.example.com/centos',
+    #                           'http://mirror2.location1.example.com/centos'],
+}
+mirror_timeout = 1.0
+yum_repo_file = 'CentOS-Base.repo'
+# /etc/yum.conf [main] options set with the local mirror. EL7 yum limits
+# parallel downloads with max_connections (dnf: max_parallel_downloads).
+yum_main_options = [('keepcache', 1),
+                    ('max_connections', 10)]
+
+# Local mirror repository Template
+yum_repo_tpl = """# Generated by ksconfig on {date}
+# Mirrors ranked by connect latency: {ranking}
+[base]
+name=CentOS-$releasever - Base
+baseurl={base}
+failovermethod=priority
+gpgcheck=1
+gpgkey=file:///etc/pki/rpm-gpg/RPM-GPG-KEY-CentOS-$releasever
+
+[updates]
+name=CentOS-$releasever - Updates
+baseurl={updates}
+failovermethod=priority
+gpgcheck=1
+gpgkey=file:///etc/pki/rpm-gpg/RPM-GPG-KEY-CentOS-$releasever
+
+[extras]
+name=CentOS-$releasever - Extras
+baseurl={extras}
+failovermethod=priority
+gpgcheck=1
+gpgkey=file:///etc/pki/rpm-gpg/RPM-GPG-KEY-CentOS-$releasever
 """
 # Settings End ################################################################
 
+try:
+    from queue import Queue  # py3k
+except ImportError:
+    from Queue import Queue
+
+try:
+    from urllib.parse import urlparse  # py3k
+except ImportError:
+    from urlparse import urlparse
+
+log = logging.getLogger('ksconfig')
+
 date = datetime.now().strftime('%Y%m%d')
 
-if DEBUG:
-    # Development/testing File Locations
-    grub_cfg_location = 'tests/grub'
-    modified_grub_cfg = 'tests/grub.out'
-    grub_cfg_backup = 'tests/grub.back-%s' % date
-else:
-    # Production File Locations
-    grub_cfg_location = '/mnt/sysimage/etc/default/grub'
-    modified_grub_cfg = '/mnt/sysimage/etc/default/grub'
-    grub_cfg_backup = '/mnt/sysimage/etc/default/grub.back-%s' % date
+# Pre Script Data, see load_config()
+server_config = {}
+disk_config = {}
 
-# Load Pre Script Data
-server_config = json.load(open('/tmp/servercfg.json', 'r'))
-disk_config = json.load(open('/tmp/disk.json', 'r'))
+
+def load_config():
+    """ Load configuration files created by %pre script from config_dir.
+    disk.json is optional as offline images are not partitioned by %pre.
+    """
+    global server_config, disk_config
+    server_config = json.load(open('%s/servercfg.json' % config_dir, 'r'))
+    try:
+        disk_config = json.load(open('%s/disk.json' % config_dir, 'r'))
+    except IOError:
+        disk_config = {}
 
 
 def copy_preconfig():
     """ Copy Configuration files created by %pre script
     """
     copy_tasks = [
-        ['/tmp/servercfg.json', '/mnt/sysimage/tmp/'],
-        ['/tmp/disk.json', '/mnt/sysimage/tmp/'],
-        ['/tmp/disk.part', '/mnt/sysimage/tmp/']
+        ['%s/servercfg.json' % config_dir, '%s/tmp/' % sysroot],
+        ['%s/disk.json' % config_dir, '%s/tmp/' % sysroot],
+        ['%s/disk.part' % config_dir, '%s/tmp/' % sysroot]
     ]
     for source, destination in copy_tasks:
+        if os.path.realpath(os.path.dirname(source)) == \
+                os.path.realpath(destination):
+            continue  # Config files already in the sysroot
         try:
             shutil.copy(source, destination)
-        except IOError:
-            pass  # TODO: Add logging
+        except IOError as e:
+            log.warning('copy %s to %s failed: %s', source, destination, e)
 
 
 def set_hostname():
@@ -81,11 +224,11 @@ def set_hostname():
     /etc/sysconfig/network (hostname)
     /etc/hosts (primary IP and hostname)
     """
-    with open('/mnt/sysimage/etc/sysconfig/network', 'w') as networkfile:
+    with open('%s/etc/sysconfig/network' % sysroot, 'w') as networkfile:
         networkfile.write('HOSTNAME=%s\n' % server_config['hostname'])
-    with open('/mnt/sysimage/etc/hostname', 'w') as hostnamefile:  # Req for 7+
+    with open('%s/etc/hostname' % sysroot, 'w') as hostnamefile:  # 7+
         hostnamefile.write('%s\n' % server_config['hostname'])
-    with open('/mnt/sysimage/etc/hosts', 'a') as hostsfile:
+    with open('%s/etc/hosts' % sysroot, 'a') as hostsfile:
         hostsfile.write('%s\t%s\n' % (server_config['pripaddr'],
                                       server_config['hostname']))
         if server_config['second_interface']:
@@ -109,19 +252,104 @@ def findmac(interface):
     return mac
 
 
+def enable_service(service):
+    """ Equivalent of systemctl enable for a multi-user.target service
+    :param service: unit name ie: dnsmasq.service
+    """
+    wants = '%s/etc/systemd/system/multi-user.target.wants' % sysroot
+    try:
+        os.makedirs(wants)
+    except OSError as e:
+        if e.errno != errno.EEXIST:
+            raise  # Other tasks may create the directory concurrently
+    if not os.path.lexists('%s/%s' % (wants, service)):
+        os.symlink('/usr/lib/systemd/system/%s' % service,
+                   '%s/%s' % (wants, service))
+
+
+def dns_servers():
+    """ Helper function to retrieve the non blank DNS servers from the
+    server configuration object.
+    :return: list of DNS server addresses
+    """
+    return [ns for ns in (server_config['primedns'],
+                          server_config['secondns']) if ns]
+
+
+def dns_cache_enabled():
+    """ Helper function to check whether the local caching resolver is
+    enabled in settings and was configured by configure_dnscache.
+    """
+    return dns_cache and os.path.exists('%s/etc/dnsmasq.d/ksconfig.conf'
+                                        % sysroot)
+
+
+def configure_dnscache():
+    """ Configure and enable dnsmasq as a local caching resolver forwarding
+    to the %pre script DNS servers
+    """
+    if not dns_cache:
+        return
+    if not os.path.exists('%s/usr/sbin/dnsmasq' % sysroot):
+        log.warning('dnsmasq is not installed in %s, resolv.conf will use '
+                    'the DNS servers directly', sysroot)
+        return
+    settings = dns_cache_settings.get(server_config['domain'],
+                                      dns_cache_settings['default'])
+    context = {
+        "date": date,
+        "servers": '\n'.join(['server=%s' % ns for ns in dns_servers()]),
+        "cache_size": settings['cache_size'],
+        "neg_ttl": settings['neg_ttl'],
+    }
+    dnsmasq_conf = '%s/etc/dnsmasq.d/ksconfig.conf' % sysroot
+    try:
+        try:
+            os.makedirs(os.path.dirname(dnsmasq_conf))
+        except OSError as e:
+            if e.errno != errno.EEXIST:
+                raise
+        with open(dnsmasq_conf, 'w') as f:
+            f.write(dnsmasq_tpl.format(**context))
+        enable_service('dnsmasq.service')
+    except (IOError, OSError) as e:
+        # The cache is optional, resolv.conf falls back to the DNS servers
+        log.warning('dnsmasq not configured, resolv.conf will use the DNS '
+                    'servers directly: %s', e)
+        try:
+            os.remove(dnsmasq_conf)  # resolv.conf checks for it
+        except OSError:
+            pass
+
+
 def configure_resolv():
     """ Backup resolv.conf and generate a new config with %pre script vars
     """
-    shutil.copy('/mnt/sysimage/etc/resolv.conf',
-                '/mnt/sysimage/etc/resolv.conf.orig')
+    shutil.copy('%s/etc/resolv.conf' % sysroot,
+                '%s/etc/resolv.conf.orig' % sysroot)
+    if dns_cache_enabled():
+        nameservers = ['127.0.0.1']
+    else:
+        nameservers = dns_servers()
+    options = []
+    for option, value in resolv_options:
+        if value is None or value is False:
+            continue
+        elif option == 'rotate' and len(nameservers) < 2:
+            continue
+        elif value is True:
+            options.append(option)
+        else:
+            options.append('%s:%s' % (option, value))
     context = {
         "date": date,
         "domain": server_config['domain'],
         "searchdomain": server_config['domain'],
-        "primedns": server_config['primedns'],
-        "secondns": server_config['secondns']
+        "nameservers": '\n'.join(['nameserver %s' % ns
+                                  for ns in nameservers]),
+        "options": 'options %s' % ' '.join(options) if options else '',
     }
-    with open('/mnt/sysimage/etc/resolv.conf', "w") as f:
+    with open('%s/etc/resolv.conf' % sysroot, "w") as f:
         f.write(resolv_tpl.format(**context))
 
 
@@ -132,7 +360,7 @@ def configure_interface(interface, ip=None, nm=None, gw=None):
     :param nm: Netmask
     :param gw: Gateway
     """
-    scripts_path = '/mnt/sysimage/etc/sysconfig/network-scripts'
+    scripts_path = '%s/etc/sysconfig/network-scripts' % sysroot
     shutil.copy('%s/ifcfg-%s' % (scripts_path, interface),
                 '%s/ifcfg-%s.orig' % (scripts_path, interface))
     context = {
@@ -148,10 +376,262 @@ def configure_interface(interface, ip=None, nm=None, gw=None):
         f.write(iface_tpl.format(**context))
 
 
+def configure_multipath():
+    """ Backup multipath.conf and use all paths of the multipath LUN(s)
+    selected by the %pre script with a round-robin path selector
+    """
+    if not disk_config.get('multipath'):
+        return
+    multipaths = ''
+    for kname, lun in sorted(disk_config['multipath'].items()):
+        multipaths += multipath_lun_tpl.format(wwid=lun['wwid'],
+                                               name=lun['name'])
+    multipath_conf = '%s/etc/multipath.conf' % sysroot
+    if os.path.exists(multipath_conf):
+        shutil.copy(multipath_conf, '%s.orig' % multipath_conf)
+    with open(multipath_conf, 'w') as f:
+        f.write(multipath_tpl.format(date=date, multipaths=multipaths))
+
+
+def rebuild_initramfs():
+    """ Rebuild the initramfs so the root LUN is assembled the same way at
+    boot. dracut copies /etc/multipath.conf, /etc/hostname and
+    /etc/sysctl.d/*.conf into the image, so this runs after those are written
+    """
+    if not disk_config.get('multipath'):
+        return
+    subprocess.check_call(['chroot', sysroot, 'dracut', '-f',
+                           '--regenerate-all', '--add', 'multipath'])
+
+
+def resolve_address(host, port):
+    """ Look up the first TCP address of a host. getaddrinfo has no timeout
+    of its own, so it runs in a daemon thread left behind after
+    mirror_timeout seconds.
+    :param host: hostname or address
+    :param port: port number
+    :return: (family, type, proto, canonname, sockaddr) or None
+    """
+    addresses = []
+
+    def lookup():
+        try:
+            addresses.extend(socket.getaddrinfo(host, port, 0,
+                                                socket.SOCK_STREAM))
+        except socket.error:
+            pass
+
+    thread = threading.Thread(target=lookup)
+    thread.daemon = True
+    thread.start()
+    thread.join(mirror_timeout)
+    if thread.is_alive() or not addresses:
+        return None
+    return addresses[0]
+
+
+def mirror_latency(url):
+    """ Measure the TCP connect latency to a mirror
+    :param url: mirror url ie: http://mirror.example.com/centos
+    :return: latency in seconds or None when unreachable within
+             mirror_timeout
+    """
+    mirror = urlparse(url)
+    try:
+        port = mirror.port or (443 if mirror.scheme == 'https' else 80)
+    except ValueError:
+        return None  # Invalid port
+    if not mirror.hostname:
+        return None
+    address = resolve_address(mirror.hostname, port)
+    if not address:
+        return None
+    family, socktype, proto, _, sockaddr = address
+    connection = socket.socket(family, socktype, proto)
+    connection.settimeout(mirror_timeout)
+    try:
+        start = time.time()
+        connection.connect(sockaddr)
+        return time.time() - start
+    except (socket.error, socket.timeout):
+        return None
+    finally:
+        connection.close()
+
+
+def rank_mirrors(urls):
+    """ Measure all mirrors concurrently and rank the reachable ones
+    :param urls: list of mirror urls
+    :return: [(latency, url)] fastest first
+    """
+    if not urls:
+        return []
+    pool = ThreadPool(len(urls))
+    try:
+        latencies = pool.map(mirror_latency, urls)
+    finally:
+        pool.close()
+        pool.join()
+    return sorted([(latency, url) for latency, url in zip(latencies, urls)
+                   if latency is not None])
+
+
+def configure_yum():
+    """ Backup yum_repo_file and point the repositories at the local
+    mirrors of the server location, fastest first. Enables keepcache and
+    parallel downloads in /etc/yum.conf.
+    """
+    mirrors = yum_mirrors.get(server_config['domain'], yum_mirrors['default'])
+    if not mirrors:
+        return
+    ranked = rank_mirrors(mirrors)
+    if not ranked:
+        log.warning('no mirror reachable for %s, yum configuration unchanged',
+                    server_config['domain'])
+        return
+    for latency, url in ranked:
+        log.info('mirror %s %.1f ms', url, latency * 1000)
+    urls = [url.rstrip('/') for latency, url in ranked]
+    context = {
+        "date": date,
+        "ranking": ', '.join(['%s (%.1f ms)' % (url, latency * 1000)
+                              for latency, url in ranked]),
+    }
+    for repo, path in (('base', 'os'), ('updates', 'updates'),
+                       ('extras', 'extras')):
+        context[repo] = '\n        '.join(['%s/$releasever/%s/$basearch/'
+                                           % (url, path) for url in urls])
+    repo_file = '%s/etc/yum.repos.d/%s' % (sysroot, yum_repo_file)
+    if os.path.exists(repo_file):
+        shutil.copy(repo_file, '%s.orig' % repo_file)
+    with open(repo_file, 'w') as f:
+        f.write(yum_repo_tpl.format(**context))
+    edit_yum_config()
+
+
+def edit_yum_config():
+    """ Set yum_main_options in the [main] section of /etc/yum.conf, the
+    section is added when missing
+    """
+    yum_conf = '%s/etc/yum.conf' % sysroot
+    yum_data = []
+    if os.path.exists(yum_conf):
+        shutil.copy(yum_conf, '%s.orig' % yum_conf)
+        infile = open(yum_conf, 'r')
+        yum_data = infile.readlines()
+        infile.close()
+    options = dict(yum_main_options)
+    outfile = open(yum_conf, 'w')
+    if not [line for line in yum_data if re.search(r'^\[main\]', line)]:
+        outfile.write('[main]\n')
+        for name, value in yum_main_options:
+            outfile.write('%s=%s\n' % (name, value))
+        if yum_data:
+            outfile.write('\n')
+    section = None
+    for line in yum_data:
+        header = re.search(r'^\[(.*)\]', line)
+        if header:
+            section = header.group(1)
+        option = re.search(r'^(\w+)\s*=', line)
+        if section == 'main' and option and option.group(1) in options:
+            continue  # Replaced below
+        outfile.write(line)
+        if header and section == 'main':
+            for name, value in yum_main_options:
+                outfile.write('%s=%s\n' % (name, value))
+    outfile.close()
+
+
+def hugepage_size(size_kb):
+    """ Format a hugepage size for the kernel command line
+    :param size_kb: hugepage size in KB ie: 2048
+    :return: size ie: 2M, 1G
+    """
+    if size_kb >= 1048576:
+        return '%sG' % (size_kb >> 20)
+    return '%sM' % (size_kb >> 10)
+
+
+def kernel_params():
+    """ Kernel parameters added to the grub command line: grub_param along
+    with memory and CPU tuning recorded by the %pre script host profile.
+    :return: list of parameters
+    """
+    params = list(grub_param)
+    hugepages = server_config.get('hugepages')
+    if hugepages:
+        size = hugepage_size(hugepages['size_kb'])
+        params.append('default_hugepagesz=%s' % size)
+        params.append('hugepagesz=%s' % size)
+        params.append('hugepages=%s' % hugepages['count'])
+    if server_config.get('thp'):
+        params.append('transparent_hugepage=%s' % server_config['thp'])
+    cpu = server_config.get('cpu')
+    if cpu:
+        if cpu.get('isolated'):
+            params.append('isolcpus=%s' % cpu['isolated'])
+            params.append('nohz_full=%s' % cpu['isolated'])
+            params.append('rcu_nocbs=%s' % cpu['isolated'])
+            params.append('irqaffinity=%s' % cpu['housekeeping'])
+        if cpu.get('max_cstate') is not None:
+            params.append('intel_idle.max_cstate=%s' % cpu['max_cstate'])
+            params.append('processor.max_cstate=%s' % cpu['max_cstate'])
+        if cpu.get('pstate'):
+            params.append('intel_pstate=%s' % cpu['pstate'])
+    return params
+
+
+def configure_cpupower():
+    """ Set the cpufreq governor of the %pre script host profile at boot
+    with cpupower.service (kernel-tools)
+    """
+    cpu = server_config.get('cpu')
+    if not cpu or not cpu.get('governor'):
+        return
+    if not os.path.exists('%s/usr/lib/systemd/system/cpupower.service'
+                          % sysroot):
+        log.warning('cpupower.service is not installed in %s, governor %s '
+                    'not configured', sysroot, cpu['governor'])
+        return
+    with open('%s/etc/sysconfig/cpupower' % sysroot, 'w') as f:
+        f.write(cpupower_tpl.format(date=date, governor=cpu['governor']))
+    enable_service('cpupower.service')
+
+
+def configure_hugepages():
+    """ Persist the hugepage reservation with sysctl and, when split across
+    NUMA nodes, the per node counts with tmpfiles.d
+    """
+    hugepages = server_config.get('hugepages')
+    if not hugepages:
+        return
+    with open('%s/etc/sysctl.d/90-ksconfig.conf' % sysroot, 'w') as f:
+        f.write(sysctl_tpl.format(date=date, count=hugepages['count']))
+    if hugepages.get('nodes'):
+        with open('%s/etc/tmpfiles.d/ksconfig-hugepages.conf' % sysroot,
+                  'w') as f:
+            f.write('# Generated by ksconfig on %s\n' % date)
+            for node, count in sorted(hugepages['nodes'].items()):
+                f.write(hugepage_node_tpl.format(node=node,
+                                                 size_kb=hugepages['size_kb'],
+                                                 count=count))
+
+
 def edit_grub_config():
     """ Edits to /etc/sysconfig/grub
     :return:
     """
+    if DEBUG:
+        # Development/testing File Locations
+        grub_cfg_location = 'tests/grub'
+        modified_grub_cfg = 'tests/grub.out'
+        grub_cfg_backup = 'tests/grub.back-%s' % date
+    else:
+        # Production File Locations
+        grub_cfg_location = '%s/etc/default/grub' % sysroot
+        modified_grub_cfg = '%s/etc/default/grub' % sysroot
+        grub_cfg_backup = '%s/etc/default/grub.back-%s' % (sysroot, date)
     shutil.copy(grub_cfg_location, grub_cfg_backup)
     infile = open(grub_cfg_location, 'r')
     grub_data = infile.readlines()
@@ -161,8 +641,8 @@ def edit_grub_config():
         grub_cmdline = re.search('^GRUB_CMDLINE_LINUX="(.*)"$', line)
         if grub_cmdline:
             param_added = ''
-            for param in grub_param:
-                if param in grub_cmdline.group(1):
+            for param in kernel_params():
+                if param in grub_cmdline.group(1).split():
                     continue
                 else:
                     param_added += ' %s' % param
@@ -173,22 +653,329 @@ def edit_grub_config():
     outfile.close()
 
 
-def main():
-    copy_preconfig()
-    edit_grub_config()
-    set_hostname()
-    configure_resolv()
-    configure_interface('eth0',
-                        server_config['pripaddr'],
-                        server_config['pripmask'],
-                        server_config['pripgate'])
+class Task:
+    """ Post configuration task
+    :param name: unique task name
+    :param func: function to call
+    :param args: arguments passed to func
+    :param requires: names of tasks which must succeed before this task
+    :param inputs: files in the sysroot read by the task
+    """
+
+    def __init__(self, name, func, args=(), requires=(), inputs=()):
+        self.name = name
+        self.func = func
+        self.args = args
+        self.requires = list(requires)
+        self.inputs = list(inputs)
+        self.status = 'pending'  # pending, running, ok, n/a, failed, skipped
+        self.duration = 0.0
+        self.result = None
+
+    def run(self):
+        """ Run the task, recording its status, duration and result
+        :return: self
+        """
+        start = time.time()
+        missing = [path for path in self.inputs
+                   if not os.path.lexists('%s%s' % (sysroot, path))]
+        if offline_mode and missing:
+            self.result = 'not in image: %s' % ', '.join(missing)
+            self.status = 'n/a'
+            return self
+        try:
+            self.result = self.func(*self.args)
+            self.status = 'ok'
+        except Exception as e:
+            self.result = '%s: %s' % (e.__class__.__name__, e)
+            self.status = 'failed'
+        self.duration = time.time() - start
+        return self
+
+
+def post_tasks():
+    """ Post configuration tasks and their dependencies
+    :return: list of Task
+    """
+    tasks = [
+        Task('copy_preconfig', copy_preconfig),
+        Task('edit_grub_config', edit_grub_config,
+             inputs=['/etc/default/grub']),
+        Task('configure_hugepages', configure_hugepages),
+        Task('configure_cpupower', configure_cpupower),
+        Task('configure_multipath', configure_multipath,
+             inputs=['/usr/sbin/multipath']),
+        Task('configure_yum', configure_yum),
+        Task('set_hostname', set_hostname),
+        Task('configure_dnscache', configure_dnscache),
+        Task('configure_resolv', configure_resolv,
+             requires=['configure_dnscache']),
+        Task('configure_eth0', configure_interface,
+             ('eth0',
+              server_config['pripaddr'],
+              server_config['pripmask'],
+              server_config['pripgate']),
+             inputs=['/etc/sysconfig/network-scripts/ifcfg-eth0']),
+    ]
     if server_config['second_interface']:
         if server_config['secondipaddr']:
-            configure_interface('eth1',
-                                server_config['secondipaddr'],
-                                server_config['secondipmask'],
-                                server_config['secondipgate'])
+            tasks.append(Task('configure_eth1', configure_interface,
+                              ('eth1',
+                               server_config['secondipaddr'],
+                               server_config['secondipmask'],
+                               server_config['secondipgate']),
+                              inputs=['/etc/sysconfig/network-scripts/'
+                                      'ifcfg-eth1']))
+    tasks.append(Task('rebuild_initramfs', rebuild_initramfs,
+                      requires=['configure_multipath', 'set_hostname',
+                                'configure_hugepages', 'configure_cpupower'],
+                      inputs=['/usr/sbin/dracut']))
+    return tasks
+
+
+def task_stages(tasks):
+    """ Group tasks into stages, each stage only requires earlier stages.
+    :param tasks: list of Task
+    :return: list of stages (lists of Task)
+    """
+    names = dict([(t.name, t) for t in tasks])
+    for task in tasks:
+        for required in task.requires:
+            if required not in names:
+                raise ValueError('%s requires unknown task %s'
+                                 % (task.name, required))
+    stages = []
+    placed = set()
+    while len(placed) < len(tasks):
+        stage = [t for t in tasks if t.name not in placed and
+                 all([r in placed for r in t.requires])]
+        if not stage:
+            raise ValueError('circular task dependencies: %s'
+                             % ', '.join([t.name for t in tasks
+                                          if t.name not in placed]))
+        stages.append(stage)
+        placed.update([t.name for t in stage])
+    return stages
+
+
+def critical_path(tasks):
+    """ Longest chain of dependent tasks, weighted by task duration (1 for
+    tasks that have not run yet).
+    :param tasks: list of Task
+    :return: list of Task
+    """
+    names = dict([(t.name, t) for t in tasks])
+    cost = {}
+    chain = {}
+    for stage in task_stages(tasks):
+        for task in stage:
+            prev = None
+            for required in task.requires:
+                if prev is None or cost[required] > cost[prev]:
+                    prev = required
+            weight = 1 if task.status == 'pending' else task.duration
+            cost[task.name] = weight + (cost[prev] if prev else 0)
+            chain[task.name] = (chain[prev] if prev else []) + [task]
+    if not cost:
+        return []
+    last = max(cost, key=lambda n: cost[n])
+    return [names[t.name] for t in chain[last]]
+
+
+def show_plan(tasks):
+    """ Print the task stages and critical path without running any task
+    """
+    for number, stage in enumerate(task_stages(tasks), 1):
+        print('stage %s:' % number)
+        for task in stage:
+            requires = ', '.join(task.requires) or '-'
+            print('    %-24s requires: %s' % (task.name, requires))
+    print('critical path: %s' % ' -> '.join([t.name for t in
+                                             critical_path(tasks)]))
+
+
+def run_tasks(tasks, workers=post_workers):
+    """ Run tasks on a thread pool. A task starts as soon as every task it
+    requires has succeeded or is not applicable; a failed task skips the
+    tasks that require it.
+    :param tasks: list of Task
+    :param workers: number of concurrent tasks
+    :return: list of Task
+    """
+    task_stages(tasks)  # Validate dependencies before running anything
+    names = dict([(t.name, t) for t in tasks])
+    finished = Queue()
+    pool = ThreadPool(workers)
+    running = 0
+    try:
+        while True:
+            changed = True
+            while changed:
+                changed = False
+                for task in tasks:
+                    if task.status != 'pending':
+                        continue
+                    required = [names[r] for r in task.requires]
+                    blocked = [r.name for r in required
+                               if r.status in ('failed', 'skipped')]
+                    if blocked:
+                        task.status = 'skipped'
+                        task.result = 'required task failed: %s' \
+                                      % ', '.join(blocked)
+                        changed = True
+                    elif all([r.status in ('ok', 'n/a') for r in required]):
+                        task.status = 'running'
+                        pool.apply_async(task.run, callback=finished.put)
+                        running += 1
+            if not running:
+                break
+            task = finished.get()
+            running -= 1
+            log.info('%s %s (%.2fs)', task.name, task.status, task.duration)
+    finally:
+        pool.close()
+        pool.join()
+    return tasks
+
+
+def main(dry_run=False, workers=post_workers):
+    load_config()
+    tasks = post_tasks()
+    if dry_run:
+        show_plan(tasks)
+        return 0
+    start = time.time()
+    run_tasks(tasks, workers)
+    for task in tasks:
+        if task.status == 'n/a':
+            log.info('%s skipped, %s', task.name, task.result)
+        elif task.status != 'ok':
+            log.error('%s %s: %s', task.name, task.status, task.result)
+    log.info('%s tasks in %.2fs, critical path: %s', len(tasks),
+             time.time() - start,
+             ' -> '.join([t.name for t in critical_path(tasks)]))
+    return len([t for t in tasks if t.status == 'failed'])
+
+
+def customize_sysroot(job):
+    """ Apply the post configuration to an offline sysroot, logging to a
+    per image log file. Runs in a process pool worker (see offline).
+    :param job: (sysroot, config_dir, log_file, workers)
+    :return: dict = {'sysroot', 'log', 'failed', 'error', 'duration'}
+    """
+    global sysroot, config_dir, offline_mode
+    sysroot, config_dir, log_file, workers = job
+    offline_mode = True
+    result = {'sysroot': sysroot, 'log': log_file, 'failed': 0, 'error': '',
+              'duration': 0.0}
+    start = time.time()
+    try:
+        handler = logging.FileHandler(log_file)
+    except IOError as e:
+        result['error'] = 'log %s: %s' % (log_file, e)
+        return result
+    handler.setFormatter(logging.Formatter(
+        '%(asctime)s %(levelname)s %(message)s'))
+    saved_handlers = log.handlers[:]
+    log.handlers = [handler]
+    log.propagate = False
+    log.setLevel(logging.INFO)
+    try:
+        log.info('ksconfig post for %s (config %s)', sysroot, config_dir)
+        result['failed'] = main(workers=workers)
+    except Exception as e:
+        result['error'] = '%s: %s' % (e.__class__.__name__, e)
+        log.error(result['error'])
+    finally:
+        handler.close()
+        log.handlers = saved_handlers
+        log.propagate = True
+    result['duration'] = time.time() - start
+    return result
+
+
+def offline_plan(jobs):
+    """ Print the task plan of each offline sysroot (see show_plan)
+    :param jobs: list of customize_sysroot jobs
+    """
+    global sysroot, config_dir
+    for job in jobs:
+        sysroot, config_dir = job[0], job[1]
+        print('%s:' % sysroot)
+        main(dry_run=True)
+
+
+def offline(jobs, processes=None):
+    """ Apply the post configuration to many offline sysroots concurrently
+    :param jobs: list of customize_sysroot jobs
+    :param processes: number of worker processes (default: cpu count)
+    :return: number of failed sysroots
+    """
+    start = time.time()
+    results = []
+    pool = multiprocessing.Pool(processes)
+    try:
+        for result in pool.imap_unordered(customize_sysroot, jobs):
+            failed = result['error'] or result['failed']
+            log.info('%s %s (%.2fs) log: %s', result['sysroot'],
+                     'failed' if failed else 'ok', result['duration'],
+                     result['log'])
+            results.append(result)
+    finally:
+        pool.close()
+        pool.join()
+    elapsed = time.time() - start
+    failures = [r for r in results if r['error'] or r['failed']]
+    log.info('%s sysroots in %.2fs (%.2f/s), %s failed', len(results),
+             elapsed, len(results) / (elapsed or 1), len(failures))
+    for result in failures:
+        log.error('%s: %s', result['sysroot'],
+                  result['error'] or '%s task(s) failed' % result['failed'])
+    return len(failures)
+
+
+def offline_jobs(sysroots, log_dir=None, workers=post_workers):
+    """ Build customize_sysroot jobs from SYSROOT[:CONFIG_DIR] arguments.
+    CONFIG_DIR defaults to SYSROOT/tmp (where copy_preconfig places the
+    %pre script files), the log file to SYSROOT/var/log/ksconfig.log or
+    LOG_DIR/<sysroot>.log.
+    """
+    jobs = []
+    for arg in sysroots:
+        root, _, conf = arg.partition(':')
+        root = os.path.abspath(root)
+        conf = os.path.abspath(conf) if conf else '%s/tmp' % root
+        if log_dir:
+            log_file = '%s/%s.log' % (log_dir,
+                                      root.strip('/').replace('/', '_'))
+        else:
+            log_file = '%s/var/log/ksconfig.log' % root
+        jobs.append((root, conf, log_file, workers))
+    return jobs
 
 
 if __name__ == "__main__":
-    main()
+    parser = argparse.ArgumentParser(description='ksconfig %post script')
+    parser.add_argument('sysroots', nargs='*', metavar='SYSROOT[:CONFIG_DIR]',
+                        help='offline mode: configure these unpacked root '
+                             'filesystems instead of %s' % sysroot)
+    parser.add_argument('--dry-run', action='store_true',
+                        help='print the task plan and critical path only')
+    parser.add_argument('-w', '--workers', type=int, default=post_workers,
+                        help='number of concurrent tasks')
+    parser.add_argument('-j', '--processes', type=int, default=None,
+                        help='offline mode: sysroots processed concurrently '
+                             '(default: cpu count)')
+    parser.add_argument('--log-dir', default=None,
+                        help='offline mode: directory for per image logs')
+    options = parser.parse_args()
+    logging.basicConfig(level=logging.INFO,
+                        format='%(asctime)s %(levelname)s %(message)s')
+    if options.sysroots:
+        jobs = offline_jobs(options.sysroots, options.log_dir,
+                            options.workers)
+        if options.dry_run:
+            offline_plan(jobs)
+            sys.exit(0)
+        sys.exit(1 if offline(jobs, options.processes) else 0)
+    sys.exit(1 if main(options.dry_run, options.workers) else 0)
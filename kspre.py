@@ -1,6 +1,7 @@
 #!/usr/bin/env python
 from snack import SnackScreen, EntryWindow, ButtonChoiceWindow
 from snack import Label, ListboxChoiceWindow
+from snack import GridFormHelp, CheckboxTree, ButtonBar, TextboxReflowed
 from time import localtime, strftime
 import subprocess
 import platform
@@ -36,9 +37,32 @@ default_var = 4000
 default_varlog = 4000
 default_yumcache = 2000
 
+# Volumes included in the required space calculation (DiskObject attributes)
+disk_volumes = ('boot', 'root', 'tmp', 'swap', 'home', 'var', 'varlog',
+                'yumcache')
+
 # Allowed overhead used for calculating available disk vs required space.
 disk_overhead_pct = 0.01  # 0.01 = 1%
 
+# Multiple Disks ###
+# When several disks are selected, vg00 spans one PV per disk. The volumes
+# below are striped across all disks instead: kickstart logvol cannot stripe,
+# so one partition per disk is combined in a RAID0 device (md_stripe) with
+# the given chunk size (KB) which holds volume group vg01.
+striped_volumes = ('var',)
+stripe_size = 512
+
+# Disk Geometry ###
+# sysfs mount point used to read device I/O geometry (/sys/block/*/queue)
+# and NUMA node memory (/sys/devices/system/node/node*/meminfo)
+sysfs = '/sys'
+# procfs mount point used to read system memory (/proc/meminfo)
+procfs = '/proc'
+# Default LVM physical extent size (KB). Raised to a multiple of the RAID
+# stripe width when the selected device reports one.
+default_pesize = 4096
+max_pesize = 65536
+
 # Disk Partitioning template ###
 # Include this in kickstart file with the following syntax:
 # %include /tmp/disk.part
@@ -52,8 +76,8 @@ diskpart_tpl = """
 # System bootloader configuration ( The user has to use grub by default )
 bootloader --location=mbr --boot-drive={device} --append="net.ifnames=0 biosdevname=0"
 
-# Ignore Multipath
-ignoredisk --only-use={device}
+# Only use the selected disk(s) (multipath LUNs by dm-uuid)
+ignoredisk --only-use={devices}
 
 # Clear the Master Boot Record
 zerombr
@@ -62,19 +86,68 @@ zerombr
 clearpart --all --initlabel
 
 # Disk partitions
-part /boot --fstype="xfs" --ondisk={device} --size={boot_size}
-part pv.21 --fstype="lvmpv" --ondisk={device} --size={required_mb}
-volgroup vg00 --pesize=4096 pv.21
-logvol /  --fstype="xfs" --size={root_size} --name=lv_root --vgname=vg00
-logvol /home  --fstype="xfs" --size={home_size} --name=lv_home --vgname=vg00
-logvol /tmp  --fstype="xfs" --size={tmp_size} --name=lv_tmp --vgname=vg00
-logvol /var  --fstype="xfs" --size={var_size} --name=lv_var --vgname=vg00
-logvol /var/log  --fstype="xfs" --size={varlog_size} --name=lv_var_log --vgname=vg00
-logvol /var/cache/yum  --fstype="xfs" --size={yumcache_size} --name=lv_var_cache_yum --vgname=vg00
-logvol swap  --fstype="swap" --size={swap_size} --name=lv_swap --vgname=vg00
+part /boot --fstype="xfs" --ondisk={device} --size={boot_size}{boot_mkfsoptions}
+{pv_parts}volgroup vg00 --pesize={pesize} {pvs}
+{stripe_parts}logvol /  --fstype="xfs" --size={root_size} --name=lv_root --vgname={root_vg}{root_mkfsoptions}
+logvol /home  --fstype="xfs" --size={home_size} --name=lv_home --vgname={home_vg}{home_mkfsoptions}
+logvol /tmp  --fstype="xfs" --size={tmp_size} --name=lv_tmp --vgname={tmp_vg}{tmp_mkfsoptions}
+logvol /var  --fstype="xfs" --size={var_size} --name=lv_var --vgname={var_vg}{var_mkfsoptions}
+logvol /var/log  --fstype="xfs" --size={varlog_size} --name=lv_var_log --vgname={varlog_vg}{varlog_mkfsoptions}
+logvol /var/cache/yum  --fstype="xfs" --size={yumcache_size} --name=lv_var_cache_yum --vgname={yumcache_vg}{yumcache_mkfsoptions}
+logvol swap  --fstype="swap" --size={swap_size} --name=lv_swap --vgname={swap_vg}
 
 """
 
+# Striped volume group partitions (see striped_volumes)
+stripe_tpl = """{raid_parts}raid pv.stripe --level=0 --device=md_stripe --chunksize={stripe_size} {raids}
+volgroup vg01 --pesize={pesize} pv.stripe
+"""
+
+# Host Profiles ###
+# Tuning applied to the installed system, selected per host.
+# swap: sizing policy as a list of tiers, first tier matching the host
+#   memory is used: (RAM up to MB or None, swap = RAM * factor, min MB,
+#   max MB or None). Replaces default_swap.
+# hugepages: None or {'size_kb': 2048, 'pct': 50, 'per_node': True}
+#   pct = percentage of memory reserved as hugepages, per_node = split the
+#   reservation across NUMA nodes by node memory.
+# thp: transparent hugepage mode ('always', 'madvise', 'never') or None
+# cpu: None or {'housekeeping_cores': 1, 'max_cstate': 1,
+#               'pstate': 'disable', 'governor': 'performance'}
+#   housekeeping_cores = cores (with SMT siblings) per NUMA node kept for
+#   the OS, remaining CPUs are isolated (isolcpus/nohz_full/rcu_nocbs).
+#   max_cstate, pstate (intel_pstate mode) and governor are optional. The
+#   governor is set at boot by cpupower.service (kernel-tools package).
+profiles = True  # Toggle profile selection
+default_profile = 'default'
+host_profiles = {
+    'default': {
+        'swap': [(2048, 2, 0, None),
+                 (8192, 1, 0, None),
+                 (None, 0, 4000, 4000)],
+        'hugepages': None,
+        'thp': None,
+        'cpu': None,
+    },
+    'database': {
+        'swap': [(16384, 0.5, 2000, None),
+                 (None, 0, 8000, 8000)],
+        'hugepages': {'size_kb': 2048, 'pct': 50, 'per_node': True},
+        'thp': 'never',
+        'cpu': None,
+    },
+    'latency': {
+        'swap': [(None, 0, 4000, 4000)],
+        'hugepages': {'size_kb': 2048, 'pct': 10, 'per_node': True},
+        'thp': 'never',
+        'cpu': {'housekeeping_cores': 1, 'max_cstate': 1,
+                'pstate': 'disable', 'governor': 'performance'},
+    },
+}
+# Host profile preselected by server location (domain: profile)
+# ie: location_profiles = {'location1.example.com': 'latency'}
+location_profiles = {}
+
 # Enable/Disable IP Validation
 ip_validation = True  # True/False
 
@@ -132,10 +205,16 @@ def convert_size(value, in_format, out_format):
 
 
 def disk_info():
-    """ Parse output of command: sfdisk -s
+    """ Parse output of command: sfdisk -s and add multipath LUNs.
+    Individual paths of a multipath LUN are not listed.
     :return: Available disk/device for OS install
+             [('label', (device, size MB, kernel name)), ...]
     """
     results = []
+    multipaths = multipath_info()
+    mpath_slaves = set()
+    for mpath in multipaths.values():
+        mpath_slaves.update(mpath['paths'])
     disks = subprocess.Popen(['sfdisk', '-s'],
                              stdout=subprocess.PIPE).stdout.readlines()
     for line in disks:
@@ -144,13 +223,251 @@ def disk_info():
             continue
         d = re.search('/dev/(.*):$', line.split()[0])
         if d:
+            if d.group(1) in mpath_slaves:
+                continue  # Listed once below as a multipath LUN
             dev, size = line.split()
             results.append(('%s - %.1f GB' % (d.group(1),
                                               convert_size(size, 'BLK', 'GB')),
-                            (d.group(1), convert_size(size, 'BLK', 'MB'))))
+                            (d.group(1), convert_size(size, 'BLK', 'MB'),
+                             d.group(1).replace('/', '!'))))
+    for kname, mpath in multipaths.items():
+        results.append(('%s - %.1f GB (%s paths)' % (mpath['name'],
+                                                     mpath['size_mb'] / 1024.0,
+                                                     len(mpath['paths'])),
+                        ('disk/by-id/dm-uuid-mpath-%s' % mpath['wwid'],
+                         mpath['size_mb'], kname)))
     return sorted(results)
 
 
+def multipath_info():
+    """ Discover multipath LUNs from /sys/block/dm-*/dm/uuid and slaves
+    :return: dict = {'dm-0': {'name': 'mpatha', 'wwid': '3600...',
+                              'paths': ['sdb', 'sdc'], 'size_mb': 102400}}
+    """
+    results = {}
+    block_path = '%s/block' % sysfs
+    if not os.path.isdir(block_path):
+        return results
+    for kname in os.listdir(block_path):
+        if not re.match(r'^dm-\d+$', kname):
+            continue
+        dm_path = '%s/%s' % (block_path, kname)
+        uuid = read_sysfs('%s/dm/uuid' % dm_path)
+        if not uuid.startswith('mpath-'):
+            continue  # LVM, crypt or partition mappings
+        slaves_path = '%s/slaves' % dm_path
+        paths = []
+        if os.path.isdir(slaves_path):
+            paths = sorted(os.listdir(slaves_path))
+        try:
+            sectors = int(read_sysfs('%s/size' % dm_path))
+        except ValueError:
+            sectors = 0
+        results[kname] = {
+            'name': read_sysfs('%s/dm/name' % dm_path, kname),
+            'wwid': uuid[len('mpath-'):],
+            'paths': paths,
+            'size_mb': sectors >> 11,  # 512 byte sectors
+        }
+    return results
+
+
+def read_sysfs(path, default=''):
+    """ Read a single value from a sysfs/procfs attribute
+    :param path: path to attribute
+    :param default: value returned when the attribute cannot be read
+    :return: stripped contents of the attribute
+    """
+    try:
+        with open(path, 'r') as f:
+            return f.read().strip()
+    except IOError:
+        return default
+
+
+def disk_geometry(device):
+    """ Read the I/O geometry of a device from /sys/block/<device>/queue
+    :param device: kernel device name ie: sda, dm-0, cciss!c0d0
+    :return: dict = {'physical_block': 4096, 'min_io': 65536, 'opt_io': 262144}
+    """
+    queue = '%s/block/%s/queue' % (sysfs, device)
+    geometry = {'physical_block': 512, 'min_io': 512, 'opt_io': 0}
+    for key, attr in (('physical_block', 'physical_block_size'),
+                      ('min_io', 'minimum_io_size'),
+                      ('opt_io', 'optimal_io_size')):
+        try:
+            geometry[key] = int(read_sysfs('%s/%s' % (queue, attr)))
+        except ValueError:
+            continue  # Keep default for missing/unreadable attribute
+    return geometry
+
+
+def mem_total():
+    """ Total system memory from /proc/meminfo
+    :return: memory in MB
+    """
+    meminfo = read_sysfs('%s/meminfo' % procfs)
+    memtotal = re.search(r'MemTotal:\s+(\d+) kB', meminfo)
+    if memtotal:
+        return int(memtotal.group(1)) >> 10
+    return 0
+
+
+def numa_memory():
+    """ Memory per NUMA node from /sys/devices/system/node/node*/meminfo
+    :return: dict = {'0': 32768, '1': 32768} (MB)
+    """
+    results = {}
+    node_path = '%s/devices/system/node' % sysfs
+    if not os.path.isdir(node_path):
+        return results
+    for node in os.listdir(node_path):
+        n = re.match(r'^node(\d+)$', node)
+        if not n:
+            continue
+        meminfo = read_sysfs('%s/%s/meminfo' % (node_path, node))
+        memtotal = re.search(r'MemTotal:\s+(\d+) kB', meminfo)
+        if memtotal:
+            results[n.group(1)] = int(memtotal.group(1)) >> 10
+    return results
+
+
+def swap_size(memory_mb, policy):
+    """ Size swap for the given memory using a profile swap policy
+    :param memory_mb: system memory (MB)
+    :param policy: list of (RAM up to MB, factor, min MB, max MB) tiers
+    :return: swap size (MB)
+    """
+    for upto, factor, min_mb, max_mb in policy:
+        if upto is None or memory_mb <= upto:
+            size = max(int(memory_mb * factor), min_mb)
+            if max_mb is not None:
+                size = min(size, max_mb)
+            return size
+    return default_swap
+
+
+def hugepage_count(memory_mb, size_kb, pct):
+    """ Number of hugepages reserving pct percent of memory_mb
+    """
+    return int((memory_mb << 10) * pct / 100) // size_kb
+
+
+def parse_cpulist(cpulist):
+    """ Parse a kernel cpu list ie: 0-3,8-11
+    :return: sorted list of cpu numbers
+    """
+    cpus = set()
+    for part in cpulist.split(','):
+        part = part.strip()
+        if not part:
+            continue
+        if '-' in part:
+            first, last = part.split('-')
+            cpus.update(range(int(first), int(last) + 1))
+        else:
+            cpus.add(int(part))
+    return sorted(cpus)
+
+
+def format_cpulist(cpus):
+    """ Format cpu numbers as a kernel cpu list ie: [0, 1, 2, 3, 8] -> 0-3,8
+    """
+    ranges = []
+    for cpu in sorted(cpus):
+        if ranges and cpu == ranges[-1][1] + 1:
+            ranges[-1][1] = cpu
+        else:
+            ranges.append([cpu, cpu])
+    return ','.join(['%s' % r[0] if r[0] == r[1] else '%s-%s' % tuple(r)
+                     for r in ranges])
+
+
+def cpu_topology():
+    """ Read online CPU topology from /sys/devices/system/cpu and
+    /sys/devices/system/node
+    :return: dict = {cpu: {'socket': 0, 'core': 0, 'node': 0}}
+    """
+    cpu_path = '%s/devices/system/cpu' % sysfs
+    node_path = '%s/devices/system/node' % sysfs
+    online = parse_cpulist(read_sysfs('%s/online' % cpu_path))
+    if not online and os.path.isdir(cpu_path):
+        online = sorted([int(c[3:]) for c in os.listdir(cpu_path)
+                         if re.match(r'^cpu\d+$', c)])
+    cpu_nodes = {}
+    if os.path.isdir(node_path):
+        for node in os.listdir(node_path):
+            n = re.match(r'^node(\d+)$', node)
+            if n:
+                cpulist = read_sysfs('%s/%s/cpulist' % (node_path, node))
+                for cpu in parse_cpulist(cpulist):
+                    cpu_nodes[cpu] = int(n.group(1))
+    topology = {}
+    for cpu in online:
+        cpu_topo = '%s/cpu%s/topology' % (cpu_path, cpu)
+        topology[cpu] = {
+            'socket': int(read_sysfs('%s/physical_package_id' % cpu_topo,
+                                     '0')),
+            'core': int(read_sysfs('%s/core_id' % cpu_topo, cpu)),
+            'node': cpu_nodes.get(cpu, 0),
+        }
+    return topology
+
+
+def cpu_sets(topology, housekeeping_cores):
+    """ Split CPUs into housekeeping and isolated sets. The first
+    housekeeping_cores cores of each NUMA node, including their SMT
+    siblings, are kept for housekeeping. CPU 0 is always housekeeping.
+    :param topology: see cpu_topology()
+    :param housekeeping_cores: cores per NUMA node kept for housekeeping
+    :return: (housekeeping cpus, isolated cpus)
+    """
+    cores = {}  # (socket, core): [cpus]
+    for cpu, topo in topology.items():
+        cores.setdefault((topo['socket'], topo['core']), []).append(cpu)
+    nodes = {}  # node: [cores ordered by lowest cpu]
+    for core in sorted(cores.values(), key=min):
+        nodes.setdefault(topology[core[0]]['node'], []).append(core)
+    housekeeping = []
+    for node_cores in nodes.values():
+        for core in node_cores[:max(housekeeping_cores, 1)]:
+            housekeeping.extend(core)
+    if 0 in topology and 0 not in housekeeping:
+        housekeeping.extend(cores[(topology[0]['socket'],
+                                   topology[0]['core'])])
+    isolated = [cpu for cpu in topology if cpu not in housekeeping]
+    return sorted(housekeeping), sorted(isolated)
+
+
+def extent_size(align_kb):
+    """ LVM physical extent size (KB) which is a multiple of align_kb
+    :param align_kb: alignment ie: full stripe width (KB)
+    :return: extent size, default_pesize when align_kb is not a power of 2
+    """
+    pesize = default_pesize
+    while pesize % align_kb and pesize < max_pesize:
+        pesize <<= 1
+    if pesize % align_kb:
+        return default_pesize
+    return pesize
+
+
+def lcm(a, b):
+    """ Least common multiple of two positive integers
+    """
+    x, y = a, b
+    while y:
+        x, y = y, x % y
+    return a * b // x
+
+
+def align_up(value, unit):
+    """ Round value up to the next multiple of unit
+    """
+    value = int(value)
+    return -(-value // unit) * unit
+
+
 def val(ip):
     """ validate IP address
     """
@@ -289,6 +606,13 @@ class ServerObject:
         self.servertype = dmidec('system-product-name')
         self.domain = ''
         self.location = ''
+        self.memory_mb = mem_total()
+        self.numa_mb = numa_memory()
+        self.profile = default_profile
+        self.swap_mb = default_swap
+        self.hugepages = {}  # {'size_kb', 'count', 'nodes'} see apply_profile
+        self.thp = ''
+        self.cpu = {}  # CPU topology and tuning, see apply_profile
         if DEBUG:
             # Debug/Test Section
             self.hostname = 'testhost'
@@ -302,6 +626,48 @@ class ServerObject:
                 self.secondipmask = '255.255.255.0'
                 self.secondipgate = '192.168.122.1'
 
+    def apply_profile(self):
+        """ Calculate swap size and hugepage reservation from the selected
+        host profile and the memory of this server.
+        """
+        profile = host_profiles[self.profile]
+        self.swap_mb = swap_size(self.memory_mb, profile['swap'])
+        self.hugepages = {}
+        hugepages = profile.get('hugepages')
+        if hugepages:
+            size_kb = hugepages['size_kb']
+            nodes = {}
+            if hugepages.get('per_node') and len(self.numa_mb) > 1:
+                for node, node_mb in self.numa_mb.items():
+                    nodes[node] = hugepage_count(node_mb, size_kb,
+                                                 hugepages['pct'])
+                count = sum(nodes.values())
+            else:
+                count = hugepage_count(self.memory_mb, size_kb,
+                                       hugepages['pct'])
+            self.hugepages = {'size_kb': size_kb,
+                              'count': count,
+                              'nodes': nodes}
+        self.thp = profile.get('thp') or ''
+        self.cpu = {}
+        cpu = profile.get('cpu')
+        if cpu:
+            topology = cpu_topology()
+            housekeeping, isolated = cpu_sets(
+                topology, cpu.get('housekeeping_cores', 1))
+            self.cpu = {
+                'cpus': len(topology),
+                'sockets': len(set([t['socket'] for t in topology.values()])),
+                'cores': len(set([(t['socket'], t['core'])
+                                  for t in topology.values()])),
+                'nodes': len(set([t['node'] for t in topology.values()])),
+                'housekeeping': format_cpulist(housekeeping),
+                'isolated': format_cpulist(isolated),
+                'max_cstate': cpu.get('max_cstate'),
+                'pstate': cpu.get('pstate'),
+                'governor': cpu.get('governor'),
+            }
+
     def write_servercfg(self):
         """ Write servercfg.json file
         """
@@ -314,56 +680,191 @@ class DiskObject:
     """
 
     def __init__(self):
-        self.device = ''
+        self.device = ''  # Boot disk, first selected disk
+        self.kname = ''  # Kernel device name ie: sda, dm-0
+        self.devices = []  # Selected disks [(device, avail MB, kname)]
+        self.multipath = {}  # Selected multipath LUNs, see multipath_info()
         self.avail_mb = 0
         self.required_mb = 0
         self.diskdiff = 0
+        self.pv_mb = 0  # vg00 PV size on each disk
+        self.raid_mb = 0  # Striped RAID0 member size on each disk
+        # Device I/O geometry (bytes), see set_geometry()
+        self.physical_block = 512
+        self.min_io = 512
+        self.opt_io = 0
+        self.align_kb = 1024  # Partition alignment (KB)
+        self.pesize = default_pesize  # LVM physical extent size (KB)
         # Define Default Partitions from settings section (MB):
         self.boot = default_boot
         self.root = default_root
         self.tmp = default_tmp
         self.swap = default_swap
+        self.profile_swap = default_swap  # Swap size of the host profile
         self.home = default_home
         self.var = default_var
         self.varlog = default_varlog
         self.yumcache = default_yumcache
 
+    def set_disks(self, disks):
+        """ Use the selected disks for the OS install. The first disk holds
+        /boot and the boot loader.
+        :param disks: [(device, avail MB, kname)] see disk_info()
+        """
+        self.devices = list(disks)
+        self.device = self.devices[0][0]
+        self.kname = self.devices[0][2]
+        self.avail_mb = sum([int(d[1]) for d in self.devices])
+        multipaths = multipath_info()
+        self.multipath = dict([(d[2], multipaths[d[2]]) for d in self.devices
+                               if d[2] in multipaths])
+        self.set_geometry()
+
+    def set_geometry(self):
+        """ Read geometry of the boot disk and derive the partition
+        alignment and LVM physical extent size from it. Additional disks are
+        expected to be identical.
+        """
+        geometry = disk_geometry(self.kname)
+        self.physical_block = geometry['physical_block']
+        self.min_io = geometry['min_io']
+        self.opt_io = geometry['opt_io']
+        self.align_kb = 1024  # Anaconda default of 1MB
+        if self.stripe():
+            self.align_kb = lcm(1024, self.opt_io >> 10)
+        self.pesize = extent_size(self.align_kb)
+
+    def stripe(self):
+        """ Stripe geometry reported by a RAID device
+        :return: (stripe unit in bytes, stripe width in units) or None
+        """
+        if self.min_io >= 4096 and self.opt_io > self.min_io and \
+                self.opt_io % self.min_io == 0 and \
+                self.opt_io <= (max_pesize << 10):
+            return self.min_io, self.opt_io // self.min_io
+        return None
+
+    def striped(self):
+        """ Volumes striped across the selected disks
+        :return: tuple of volume names, empty for a single disk
+        """
+        if len(self.devices) > 1:
+            return tuple([v for v in striped_volumes if v in disk_volumes
+                          and v != 'boot'])
+        return ()
+
+    def stripe_pesize(self):
+        """ Extent size (KB) of the striped volume group
+        """
+        return extent_size(stripe_size * len(self.devices))
+
+    def mkfs_options(self, stripe=None):
+        """ XFS mkfs options matching the device geometry
+        :param stripe: (stripe unit in bytes, width) overriding the device
+        :return: kickstart --mkfsoptions argument or ''
+        """
+        options = []
+        if self.physical_block > 512:
+            options.append('-s size=%s' % self.physical_block)
+        stripe = stripe or self.stripe()
+        if stripe:
+            options.append('-d su=%sk,sw=%s' % (stripe[0] >> 10, stripe[1]))
+        if options:
+            return ' --mkfsoptions="%s"' % ' '.join(options)
+        return ''
+
     def validate_parts(self):
-        self.required_mb = 0
-        for i in vars(self).items():
-            if i[0] in ('device', 'avail_mb', 'required_mb', 'diskdiff'):
-                continue  # Exclude from validation
+        """ Calculate the space required on each selected disk: /boot on the
+        first disk, an equal share of vg00 and of the striped volumes on
+        every disk.
+        :return: True when a disk does not have enough space
+        """
+        ndisks = len(self.devices) or 1
+        align_mb = self.align_kb >> 10
+        linear_mb = 0
+        stripe_mb = 0
+        for volume in disk_volumes:
+            if volume == 'boot':
+                continue
+            elif volume in self.striped():
+                stripe_mb += align_up(getattr(self, volume),
+                                      self.stripe_pesize() >> 10)
             else:
-                self.required_mb += int(i[1])
-        self.required_mb += int(self.required_mb * disk_overhead_pct)
-        if self.required_mb < self.avail_mb:
-            self.diskdiff = int(self.avail_mb) - int(self.required_mb)
+                # Volumes are allocated in whole extents
+                linear_mb += align_up(getattr(self, volume),
+                                      self.pesize >> 10)
+        linear_mb += int(linear_mb * disk_overhead_pct)
+        self.pv_mb = align_up(align_up(linear_mb, ndisks) // ndisks,
+                              align_mb)
+        self.raid_mb = 0
+        if stripe_mb:
+            stripe_mb += int(stripe_mb * disk_overhead_pct)
+            self.raid_mb = align_up(align_up(stripe_mb, ndisks) // ndisks,
+                                    lcm(align_mb, max(stripe_size >> 10, 1)))
+        boot_mb = align_up(self.boot, align_mb)
+        self.required_mb = boot_mb + (self.pv_mb + self.raid_mb) * ndisks
+        disk_mb = [int(d[1]) for d in self.devices] or [int(self.avail_mb)]
+        # Smallest space left on any disk, /boot is on the first disk only
+        self.diskdiff = min([avail - self.pv_mb - self.raid_mb -
+                             (boot_mb if i == 0 else 0)
+                             for i, avail in enumerate(disk_mb)])
+        if self.diskdiff > 0:
             return False
         else:
             # ToDo: Add user feedback
-            self.diskdiff = int(self.avail_mb) - int(self.required_mb)
             return True
 
-    def write_parts(self):
-        """ Writes disk configuration files.
+    def render_parts(self):
+        """ Render the disk partitioning kickstart commands.
         See Settings -> diskpart_tpl for disk.part template
-        :return: /tmp/disk.part & /tmp/disk.json
+        :return: disk.part contents
         """
+        devices = [d[0] for d in self.devices] or [self.device]
+        pvs = ['pv.%s' % (21 + i) for i in range(len(devices))]
+        raids = ['raid.%s' % (21 + i) for i in range(len(devices))]
         context = {
             "device": self.device,
-            "required_mb": self.required_mb,
-            "boot_size": self.boot,
-            "yumcache_size": self.yumcache,
-            "home_size": self.home,
-            "swap_size": self.swap,
-            "var_size": self.var,
-            "varlog_size": self.varlog,
-            "root_size": self.root,
-            "tmp_size": self.tmp,
+            "devices": ','.join(devices),
+            "pesize": self.pesize,
+            "pvs": ' '.join(pvs),
+            "pv_parts": ''.join(['part %s --fstype="lvmpv" --ondisk=%s '
+                                 '--size=%s\n' % (pv, device, self.pv_mb)
+                                 for pv, device in zip(pvs, devices)]),
+            "stripe_parts": '',
+            "boot_size": align_up(self.boot, self.align_kb >> 10),
+            "boot_mkfsoptions": self.mkfs_options(),
         }
+        if self.striped():
+            context["stripe_parts"] = stripe_tpl.format(
+                raid_parts=''.join(['part %s --ondisk=%s --size=%s\n'
+                                    % (raid, device, self.raid_mb)
+                                    for raid, device in zip(raids, devices)]),
+                stripe_size=stripe_size,
+                raids=' '.join(raids),
+                pesize=self.stripe_pesize())
+        for volume in disk_volumes:
+            if volume == 'boot':
+                continue
+            if volume in self.striped():
+                vg, pesize = 'vg01', self.stripe_pesize()
+                mkfsoptions = self.mkfs_options((stripe_size << 10,
+                                                 len(devices)))
+            else:
+                vg, pesize = 'vg00', self.pesize
+                mkfsoptions = self.mkfs_options()
+            context["%s_size" % volume] = align_up(getattr(self, volume),
+                                                   pesize >> 10)
+            context["%s_vg" % volume] = vg
+            context["%s_mkfsoptions" % volume] = mkfsoptions
+        return diskpart_tpl.format(**context)
+
+    def write_parts(self):
+        """ Writes disk configuration files.
+        :return: /tmp/disk.part & /tmp/disk.json
+        """
         # Write /tmp/disk.part to be included in kickstart
         with open('/tmp/disk.part', 'w') as f:
-            f.write(diskpart_tpl.format(**context))
+            f.write(self.render_parts())
         # Serialize data in JSON format for future use
         with open('/tmp/disk.json', 'w') as f:
             f.write(json.dumps(vars(self), sort_keys=True, indent=4))
@@ -414,6 +915,21 @@ class PreConfig:
             else:
                 svrobj.domain = location[1][0]
                 svrobj.location = location[1][1]
+            svrobj.profile = location_profiles.get(svrobj.domain,
+                                                   svrobj.profile)
+
+    def get_profile(self, svrobj):
+        """ Prompt for host profile specified by settings
+        """
+        profile_names = sorted(host_profiles.keys())
+        profile = ListboxChoiceWindow(self.screen, 'Host Profile',
+                                      'Select a host profile:',
+                                      [(p, p) for p in profile_names],
+                                      buttons=['Ok'], help=None,
+                                      default=profile_names.index(
+                                          svrobj.profile))
+        if profile[0] != 'cancel':
+            svrobj.profile = profile[1]
 
     def get_network(self, svrobj):
         """ Prompt for Hostname and network IP's
@@ -527,15 +1043,28 @@ Secondary DNS-----------> {secondns}
                            serverinfo_tpl.format(**context), help=None)
 
     def get_diskinfo(self, dskobj):
-        """ Select disk to be used as for operating system installation.
+        """ Select disk(s) to be used for operating system installation.
+        The first selected disk is used for /boot, selecting several
+        (identical) disks spans the volumes across them.
         :param dskobj: DiskObject
         :return: Nothing
         """
-        avail_disks = ListboxChoiceWindow(self.screen, 'Available Disks',
-                                          'Select disk for OS install:',
-                                          disk_info(), help=None)
-        dskobj.device = avail_disks[1][0]
-        dskobj.avail_mb = avail_disks[1][1]
+        avail_disks = disk_info()
+        selected = [d[0] for d in dskobj.devices]
+        selection = []
+        while not selection:
+            grid = GridFormHelp(self.screen, 'Available Disks', None, 1, 3)
+            grid.add(TextboxReflowed(40, 'Select disk(s) for OS install:'),
+                     0, 0)
+            disk_tree = CheckboxTree(height=min(len(avail_disks), 10),
+                                     scroll=len(avail_disks) > 10)
+            for label, disk in avail_disks:
+                disk_tree.append(label, disk, selected=disk[0] in selected)
+            grid.add(disk_tree, 0, 1, padding=(0, 1, 0, 1))
+            grid.add(ButtonBar(self.screen, ['Ok']), 0, 2, growx=1)
+            grid.runOnce()
+            selection = disk_tree.getSelection()
+        dskobj.set_disks(selection)
 
     def get_diskconfig(self, dskobj):
         """ Prompt user to modify volume sizes or accept defaults specified by
@@ -544,10 +1073,18 @@ Secondary DNS-----------> {secondns}
         :return: Nothing
         """
         dskobj.validate_parts()  # Run validator to populate required space
+        if len(dskobj.devices) > 1:
+            disk_text = 'Disks = %s (%s MB each)\n' \
+                        'Striped = %s\n' % \
+                        (len(dskobj.devices), dskobj.pv_mb + dskobj.raid_mb,
+                         ', '.join(dskobj.striped()) or 'none')
+        else:
+            disk_text = ''
         disk_config = EntryWindow(self.screen, 'Configure Disk',
-                                  'Available space = %s MB\n'
+                                  '%sAvailable space = %s MB\n'
                                   'Required space = %s MB' %
-                                  (dskobj.avail_mb, dskobj.required_mb),
+                                  (disk_text, dskobj.avail_mb,
+                                   dskobj.required_mb),
                                   [('/boot', '%s' % dskobj.boot),
                                    ('/', '%s' % dskobj.root),
                                    ('/tmp', '%s' % dskobj.tmp),
@@ -577,12 +1114,15 @@ Secondary DNS-----------> {secondns}
             dskobj.var = default_var
             dskobj.varlog = default_varlog
             dskobj.yumcache = default_yumcache
-            dskobj.swap = default_swap
+            dskobj.swap = dskobj.profile_swap
 
     def show_diskconfig(self, dskobj):
         """ Displays disk volume configuration before confirmation.
         """
         diskconfig_tpl = """
+    disks -----------> {disks}
+    striped ---------> {striped}
+
     /boot -----------> {boot}
     / ---------------> {root}
     /tmp ------------> {tmp}
@@ -594,6 +1134,9 @@ Secondary DNS-----------> {secondns}
     swap ------------> {swap}
 """
         context = {
+            "disks": ', '.join([d[0].split('/')[-1]
+                                for d in dskobj.devices]),
+            "striped": ', '.join(dskobj.striped()) or 'none',
             "boot": dskobj.boot,
             "root": dskobj.root,
             "tmp": dskobj.tmp,
@@ -626,9 +1169,18 @@ Secondary DNS-----------> {secondns}
 
 
 def main(config, server, disk):
+    profile = None
     while config.complete == 0:
         if locations:
             config.get_location(server)
+        if profiles:
+            config.get_profile(server)
+        if server.profile != profile:
+            # Swap size follows the host profile unless edited afterwards
+            profile = server.profile
+            server.apply_profile()
+            disk.profile_swap = server.swap_mb
+            disk.swap = server.swap_mb
         config.get_network(server)
         while config.validate_ip(server) and ip_validation:
             config.show_invalid(server)
@@ -0,0 +1,18 @@
+import os
+import sys
+import types
+
+TESTS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(TESTS_DIR))
+
+try:
+    import snack  # noqa: F401
+except ImportError:
+    # kspre.py imports the newt (snack) widgets at module level; only the
+    # non-interactive helpers are tested, so provide empty widget names.
+    snack = types.ModuleType('snack')
+    for widget in ('SnackScreen', 'EntryWindow', 'ButtonChoiceWindow',
+                   'Label', 'ListboxChoiceWindow', 'GridFormHelp',
+                   'CheckboxTree', 'ButtonBar', 'TextboxReflowed'):
+        setattr(snack, widget, type(widget, (object,), {}))
+    sys.modules['snack'] = snack
@@ -0,0 +1,49 @@
+import pytest
+
+import kspost
+
+
+@pytest.fixture
+def sysroot(tmpdir, monkeypatch):
+    tmpdir.mkdir('etc').join('resolv.conf').write('nameserver 10.0.0.1\n')
+    tmpdir.mkdir('usr').mkdir('sbin').join('dnsmasq').write('')
+    monkeypatch.setattr(kspost, 'sysroot', str(tmpdir))
+    monkeypatch.setattr(kspost, 'dns_cache', True)
+    monkeypatch.setattr(kspost, 'server_config',
+                        {'domain': 'location1.example.com',
+                         'primedns': '192.168.1.53',
+                         'secondns': '192.168.2.53'})
+    return tmpdir
+
+
+def nameservers(sysroot):
+    return [line.split()[1] for line in
+            sysroot.join('etc', 'resolv.conf').readlines()
+            if line.startswith('nameserver')]
+
+
+def test_dnscache_creates_dnsmasq_dir(sysroot):
+    kspost.configure_dnscache()
+    conf = sysroot.join('etc', 'dnsmasq.d', 'ksconfig.conf').read()
+    assert 'server=192.168.1.53\nserver=192.168.2.53\n' in conf
+    assert sysroot.join('etc', 'systemd', 'system',
+                        'multi-user.target.wants', 'dnsmasq.service').islink()
+    kspost.configure_resolv()
+    assert nameservers(sysroot) == ['127.0.0.1']
+
+
+def test_dnscache_write_failure_falls_back(sysroot):
+    # A file where the directory should be, the config cannot be written
+    sysroot.join('etc', 'dnsmasq.d').write('')
+    kspost.configure_dnscache()
+    assert not sysroot.join('etc', 'systemd').check()
+    kspost.configure_resolv()
+    assert nameservers(sysroot) == ['192.168.1.53', '192.168.2.53']
+
+
+def test_dnsmasq_not_installed(sysroot):
+    sysroot.join('usr', 'sbin', 'dnsmasq').remove()
+    kspost.configure_dnscache()
+    assert not sysroot.join('etc', 'dnsmasq.d').check()
+    kspost.configure_resolv()
+    assert nameservers(sysroot) == ['192.168.1.53', '192.168.2.53']
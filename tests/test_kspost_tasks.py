@@ -0,0 +1,129 @@
+import threading
+
+import pytest
+
+import kspost
+from kspost import Task
+
+
+def ok(value=None):
+    return value
+
+
+def fail():
+    raise IOError('missing file')
+
+
+def by_name(tasks):
+    return dict([(t.name, t) for t in tasks])
+
+
+def test_failure_skips_dependents_only():
+    tasks = [Task('a', fail),
+             Task('b', ok, requires=['a']),
+             Task('c', ok, requires=['b']),
+             Task('d', ok, ('d',)),
+             Task('e', ok, requires=['d'])]
+    tasks = by_name(kspost.run_tasks(tasks, 2))
+    assert tasks['a'].status == 'failed'
+    assert tasks['a'].result.endswith(': missing file')
+    assert tasks['b'].status == 'skipped'
+    assert tasks['b'].result == 'required task failed: a'
+    assert tasks['c'].status == 'skipped'
+    assert tasks['c'].result == 'required task failed: b'
+    assert tasks['d'].status == 'ok'
+    assert tasks['d'].result == 'd'
+    assert tasks['e'].status == 'ok'
+
+
+def test_requires_run_first():
+    order = []
+    tasks = [Task('second', order.append, ('second',), requires=['first']),
+             Task('first', order.append, ('first',))]
+    kspost.run_tasks(tasks, 4)
+    assert order == ['first', 'second']
+
+
+def test_unknown_dependency():
+    with pytest.raises(ValueError) as e:
+        kspost.run_tasks([Task('a', ok, requires=['missing'])])
+    assert 'a requires unknown task missing' in str(e.value)
+
+
+def test_circular_dependency():
+    tasks = [Task('a', ok, requires=['b']),
+             Task('b', ok, requires=['a']),
+             Task('c', ok)]
+    with pytest.raises(ValueError) as e:
+        kspost.task_stages(tasks)
+    assert 'circular task dependencies: a, b' in str(e.value)
+    for task in tasks:
+        assert task.status == 'pending'
+
+
+def test_independent_tasks_overlap():
+    # Each task waits for the other, this only passes when both run at once
+    barrier = threading.Barrier(2, timeout=5)
+    tasks = kspost.run_tasks([Task('a', barrier.wait), Task('b', barrier.wait)],
+                             2)
+    assert [t.status for t in tasks] == ['ok', 'ok']
+
+
+def test_duration_recorded():
+    tasks = kspost.run_tasks([Task('a', ok)])
+    assert tasks[0].duration >= 0
+    assert tasks[0].status == 'ok'
+
+
+def test_show_plan(capsys):
+    tasks = [Task('copy', ok),
+             Task('grub', ok),
+             Task('cache', ok),
+             Task('resolv', ok, requires=['cache']),
+             Task('mirror', ok, requires=['resolv', 'grub'])]
+    kspost.show_plan(tasks)
+    assert capsys.readouterr().out == (
+        'stage 1:\n'
+        '    copy                     requires: -\n'
+        '    grub                     requires: -\n'
+        '    cache                    requires: -\n'
+        'stage 2:\n'
+        '    resolv                   requires: cache\n'
+        'stage 3:\n'
+        '    mirror                   requires: resolv, grub\n'
+        'critical path: cache -> resolv -> mirror\n')
+
+
+def test_critical_path_uses_durations():
+    tasks = [Task('short', ok), Task('long', ok),
+             Task('after_short', ok, requires=['short'])]
+    for task, duration in zip(tasks, (0.1, 5.0, 0.1)):
+        task.status = 'ok'
+        task.duration = duration
+    assert [t.name for t in kspost.critical_path(tasks)] == ['long']
+
+
+@pytest.fixture
+def image(tmpdir, monkeypatch):
+    tmpdir.mkdir('etc').mkdir('default').join('grub').write('')
+    monkeypatch.setattr(kspost, 'sysroot', str(tmpdir))
+    monkeypatch.setattr(kspost, 'offline_mode', True)
+    return tmpdir
+
+
+def test_offline_missing_input_not_applicable(image):
+    tasks = [Task('grub', ok, ('grub',), inputs=['/etc/default/grub']),
+             Task('dracut', fail, inputs=['/usr/sbin/dracut']),
+             Task('after_dracut', ok, ('after',), requires=['dracut'])]
+    tasks = by_name(kspost.run_tasks(tasks))
+    assert tasks['grub'].status == 'ok'
+    assert tasks['dracut'].status == 'n/a'
+    assert tasks['dracut'].result == 'not in image: /usr/sbin/dracut'
+    assert tasks['after_dracut'].status == 'ok'
+
+
+def test_missing_input_runs_outside_offline_mode(image, monkeypatch):
+    monkeypatch.setattr(kspost, 'offline_mode', False)
+    tasks = kspost.run_tasks([Task('dracut', fail,
+                                   inputs=['/usr/sbin/dracut'])])
+    assert tasks[0].status == 'failed'
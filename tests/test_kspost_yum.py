@@ -0,0 +1,146 @@
+import os
+import socket
+import threading
+import time
+
+import pytest
+
+import kspost
+
+try:
+    from http.server import HTTPServer, SimpleHTTPRequestHandler  # py3k
+except ImportError:
+    from BaseHTTPServer import HTTPServer
+    from SimpleHTTPServer import SimpleHTTPRequestHandler
+
+
+@pytest.fixture
+def stub_mirror():
+    """ Local HTTP server standing in for a package mirror
+    """
+    server = HTTPServer(('127.0.0.1', 0), SimpleHTTPRequestHandler)
+    thread = threading.Thread(target=server.serve_forever)
+    thread.daemon = True
+    thread.start()
+    yield 'http://127.0.0.1:%s/centos' % server.server_address[1]
+    server.shutdown()
+    server.server_close()
+
+
+@pytest.fixture
+def closed_port():
+    """ Mirror url on a local port nothing listens on
+    """
+    sock = socket.socket()
+    sock.bind(('127.0.0.1', 0))
+    port = sock.getsockname()[1]
+    sock.close()
+    return 'http://127.0.0.1:%s/centos' % port
+
+
+@pytest.fixture
+def sysroot(tmpdir, monkeypatch):
+    tmpdir.mkdir('etc').mkdir('yum.repos.d')
+    monkeypatch.setattr(kspost, 'sysroot', str(tmpdir))
+    monkeypatch.setattr(kspost, 'server_config',
+                        {'domain': 'location1.example.com'})
+    return tmpdir
+
+
+def test_mirror_latency(stub_mirror, closed_port):
+    assert kspost.mirror_latency(stub_mirror) >= 0
+    assert kspost.mirror_latency(closed_port) is None
+    assert kspost.mirror_latency('mirror.example.com/centos') is None
+    assert kspost.mirror_latency('http://127.0.0.1:port/centos') is None
+
+
+def test_mirror_latency_slow_lookup(monkeypatch):
+    lookup = threading.Event()
+
+    def getaddrinfo(*args):
+        lookup.wait(5)  # Resolver that does not answer
+        raise socket.gaierror('timed out')
+
+    monkeypatch.setattr(kspost, 'mirror_timeout', 0.2)
+    monkeypatch.setattr(kspost.socket, 'getaddrinfo', getaddrinfo)
+    start = time.time()
+    assert kspost.mirror_latency('http://mirror.example.com/centos') is None
+    assert time.time() - start < 1
+    lookup.set()
+
+
+def test_rank_mirrors_drops_unreachable(stub_mirror, closed_port):
+    ranked = kspost.rank_mirrors([closed_port, 'not a url', stub_mirror])
+    assert [url for latency, url in ranked] == [stub_mirror]
+
+
+def test_rank_mirrors_order(monkeypatch):
+    latencies = {'http://a/centos': 0.030, 'http://b/centos': None,
+                 'http://c/centos': 0.002, 'http://d/centos': 0.010}
+    monkeypatch.setattr(kspost, 'mirror_latency', latencies.get)
+    ranked = kspost.rank_mirrors(sorted(latencies))
+    assert [url for latency, url in ranked] == ['http://c/centos',
+                                               'http://d/centos',
+                                               'http://a/centos']
+
+
+def test_rank_mirrors_empty():
+    assert kspost.rank_mirrors([]) == []
+
+
+def test_configure_yum(sysroot, monkeypatch, stub_mirror, closed_port):
+    sysroot.join('etc', 'yum.repos.d', 'CentOS-Base.repo').write('orig\n')
+    sysroot.join('etc', 'yum.conf').write('[main]\ncachedir=/var/cache/yum\n'
+                                          'keepcache=0\n')
+    monkeypatch.setattr(kspost, 'yum_mirrors', {
+        'default': [],
+        'location1.example.com': [closed_port, stub_mirror + '/'],
+    })
+    kspost.configure_yum()
+    repo_dir = sysroot.join('etc', 'yum.repos.d')
+    assert repo_dir.join('CentOS-Base.repo.orig').read() == 'orig\n'
+    repo = repo_dir.join('CentOS-Base.repo').read()
+    assert 'baseurl=%s/$releasever/os/$basearch/\n' % stub_mirror in repo
+    assert 'baseurl=%s/$releasever/updates/$basearch/\n' % stub_mirror \
+        in repo
+    assert 'baseurl=%s/$releasever/extras/$basearch/\n' % stub_mirror in repo
+    assert closed_port not in repo
+    assert sysroot.join('etc', 'yum.conf').read() == \
+        '[main]\nkeepcache=1\nmax_connections=10\ncachedir=/var/cache/yum\n'
+
+
+def test_configure_yum_failover_order(sysroot, monkeypatch):
+    sysroot.join('etc', 'yum.conf').write('[main]\n')
+    monkeypatch.setattr(kspost, 'yum_mirrors', {
+        'default': ['http://slow/centos', 'http://fast/centos']})
+    monkeypatch.setattr(kspost, 'mirror_latency',
+                        {'http://slow/centos': 0.05,
+                         'http://fast/centos': 0.01}.get)
+    kspost.configure_yum()
+    repo = sysroot.join('etc', 'yum.repos.d', 'CentOS-Base.repo').read()
+    assert 'baseurl=http://fast/centos/$releasever/os/$basearch/\n' \
+           '        http://slow/centos/$releasever/os/$basearch/\n' in repo
+
+
+def test_configure_yum_unreachable(sysroot, monkeypatch, closed_port):
+    monkeypatch.setattr(kspost, 'yum_mirrors', {'default': [closed_port]})
+    kspost.configure_yum()
+    assert not os.path.exists(str(sysroot.join('etc', 'yum.conf')))
+    assert sysroot.join('etc', 'yum.repos.d').listdir() == []
+
+
+def test_edit_yum_config_other_sections(sysroot):
+    sysroot.join('etc', 'yum.conf').write(
+        '[main]\nkeepcache=0\ndebuglevel=2\n\n[custom]\nkeepcache=0\n')
+    kspost.edit_yum_config()
+    assert sysroot.join('etc', 'yum.conf').read() == \
+        '[main]\nkeepcache=1\nmax_connections=10\ndebuglevel=2\n\n' \
+        '[custom]\nkeepcache=0\n'
+    assert sysroot.join('etc', 'yum.conf.orig').check()
+
+
+def test_edit_yum_config_missing_main(sysroot):
+    sysroot.join('etc', 'yum.conf').write('[custom]\nkeepcache=0\n')
+    kspost.edit_yum_config()
+    assert sysroot.join('etc', 'yum.conf').read() == \
+        '[main]\nkeepcache=1\nmax_connections=10\n\n[custom]\nkeepcache=0\n'
@@ -0,0 +1,89 @@
+import os
+
+import pytest
+
+import kspre
+
+
+def write(path, value):
+    if not os.path.isdir(os.path.dirname(path)):
+        os.makedirs(os.path.dirname(path))
+    with open(path, 'w') as f:
+        f.write('%s\n' % value)
+
+
+def build_topology(root, sockets, cores, threads, numa=True):
+    """ Create a fake /sys/devices/system/{cpu,node} tree. CPUs are numbered
+    like the kernel does: first thread of every core, then the siblings.
+    """
+    cpu_path = os.path.join(root, 'devices', 'system', 'cpu')
+    node_path = os.path.join(root, 'devices', 'system', 'node')
+    ncpus = sockets * cores * threads
+    write(os.path.join(cpu_path, 'online'), '0-%s' % (ncpus - 1))
+    node_cpus = {}
+    for cpu in range(ncpus):
+        socket, core = divmod(cpu % (sockets * cores), cores)
+        topology = os.path.join(cpu_path, 'cpu%s' % cpu, 'topology')
+        write(os.path.join(topology, 'physical_package_id'), socket)
+        write(os.path.join(topology, 'core_id'), core)
+        node_cpus.setdefault(socket, []).append(cpu)
+    if numa:
+        for node, cpus in node_cpus.items():
+            write(os.path.join(node_path, 'node%s' % node, 'cpulist'),
+                  kspre.format_cpulist(cpus))
+
+
+@pytest.mark.parametrize('cpulist, cpus', [
+    ('0', [0]),
+    ('0-3', [0, 1, 2, 3]),
+    ('0-3,8-11', [0, 1, 2, 3, 8, 9, 10, 11]),
+    ('1,3,5', [1, 3, 5]),
+    ('', []),
+])
+def test_cpulist_round_trip(cpulist, cpus):
+    assert kspre.parse_cpulist(cpulist) == cpus
+    assert kspre.format_cpulist(cpus) == cpulist
+
+
+def test_format_cpulist_unsorted():
+    assert kspre.format_cpulist([8, 2, 0, 1]) == '0-2,8'
+
+
+@pytest.mark.parametrize('sockets, cores, threads, numa, housekeeping, '
+                         'isolated', [
+                             # 1 socket, 4 cores, SMT
+                             (1, 4, 2, True, '0,4', '1-3,5-7'),
+                             # 2 sockets / NUMA nodes, 8 cores, SMT
+                             (2, 8, 2, True, '0,8,16,24',
+                              '1-7,9-15,17-23,25-31'),
+                             # 2 sockets without NUMA node information
+                             (2, 4, 1, False, '0', '1-7'),
+                             # single core
+                             (1, 1, 1, True, '0', ''),
+                         ])
+def test_cpu_sets(tmpdir, monkeypatch, sockets, cores, threads, numa,
+                  housekeeping, isolated):
+    build_topology(str(tmpdir), sockets, cores, threads, numa)
+    monkeypatch.setattr(kspre, 'sysfs', str(tmpdir))
+    topology = kspre.cpu_topology()
+    assert len(topology) == sockets * cores * threads
+    cpus = kspre.cpu_sets(topology, 1)
+    assert kspre.format_cpulist(cpus[0]) == housekeeping
+    assert kspre.format_cpulist(cpus[1]) == isolated
+
+
+def test_cpu_sets_two_housekeeping_cores(tmpdir, monkeypatch):
+    build_topology(str(tmpdir), 2, 4, 2)
+    monkeypatch.setattr(kspre, 'sysfs', str(tmpdir))
+    housekeeping, isolated = kspre.cpu_sets(kspre.cpu_topology(), 2)
+    assert kspre.format_cpulist(housekeeping) == '0-1,4-5,8-9,12-13'
+    assert kspre.format_cpulist(isolated) == '2-3,6-7,10-11,14-15'
+
+
+def test_cpu_topology_nodes(tmpdir, monkeypatch):
+    build_topology(str(tmpdir), 2, 2, 2)
+    monkeypatch.setattr(kspre, 'sysfs', str(tmpdir))
+    topology = kspre.cpu_topology()
+    assert topology[0] == {'socket': 0, 'core': 0, 'node': 0}
+    assert topology[3] == {'socket': 1, 'core': 1, 'node': 1}
+    assert topology[4] == {'socket': 0, 'core': 0, 'node': 0}
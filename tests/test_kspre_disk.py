@@ -0,0 +1,201 @@
+import io
+import os
+
+import pytest
+
+import kspre
+
+SYSFS = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'sys')
+
+
+@pytest.fixture(autouse=True)
+def fixture_sysfs(monkeypatch):
+    monkeypatch.setattr(kspre, 'sysfs', SYSFS)
+
+
+def disk(device, avail_mb=100000):
+    dskobj = kspre.DiskObject()
+    dskobj.set_disks([(device, avail_mb, device)])
+    dskobj.validate_parts()
+    return dskobj
+
+
+def part_lines(dskobj, prefix):
+    return [line for line in dskobj.render_parts().splitlines()
+            if line.startswith(prefix)]
+
+
+def test_disk_geometry_512e():
+    assert kspre.disk_geometry('sda') == {'physical_block': 4096,
+                                          'min_io': 4096, 'opt_io': 0}
+
+
+def test_disk_geometry_missing_device_defaults():
+    assert kspre.disk_geometry('sdx') == {'physical_block': 512,
+                                          'min_io': 512, 'opt_io': 0}
+
+
+def test_512e_sector_size_only():
+    dskobj = disk('sda')
+    assert dskobj.stripe() is None
+    assert dskobj.align_kb == 1024
+    assert dskobj.pesize == 4096
+    assert dskobj.mkfs_options() == ' --mkfsoptions="-s size=4096"'
+
+
+def test_4kn_sector_size_only():
+    dskobj = disk('nvme0n1')
+    assert dskobj.stripe() is None
+    assert dskobj.mkfs_options() == ' --mkfsoptions="-s size=4096"'
+
+
+def test_raid_stripe():
+    dskobj = disk('sdb')
+    assert dskobj.stripe() == (65536, 4)
+    assert dskobj.align_kb == 1024
+    assert dskobj.pesize == 4096
+    assert dskobj.mkfs_options() == ' --mkfsoptions="-d su=64k,sw=4"'
+
+
+def test_raid_wide_stripe_raises_pesize():
+    dskobj = disk('sdd')
+    assert dskobj.stripe() == (1048576, 8)
+    assert dskobj.align_kb == 8192
+    assert dskobj.pesize == 8192
+
+
+def test_raid_non_power_of_two_stripe_keeps_default_pesize():
+    dskobj = disk('sdc')
+    assert dskobj.stripe() == (65536, 6)
+    assert dskobj.align_kb == 3072
+    assert dskobj.pesize == kspre.default_pesize
+    assert dskobj.pv_mb % 3 == 0
+
+
+def test_disk_part_512e():
+    dskobj = disk('sda')
+    assert part_lines(dskobj, 'part /boot') == [
+        'part /boot --fstype="xfs" --ondisk=sda --size=500 '
+        '--mkfsoptions="-s size=4096"']
+    assert part_lines(dskobj, 'volgroup') == [
+        'volgroup vg00 --pesize=4096 pv.21']
+    for line in part_lines(dskobj, 'logvol'):
+        if 'fstype="xfs"' in line:
+            assert line.endswith(' --mkfsoptions="-s size=4096"')
+        else:
+            assert 'mkfsoptions' not in line
+
+
+def test_disk_part_raid_aligned_sizes():
+    dskobj = disk('sdd')
+    assert part_lines(dskobj, 'volgroup') == [
+        'volgroup vg00 --pesize=8192 pv.21']
+    assert part_lines(dskobj, 'logvol /  ') == [
+        'logvol /  --fstype="xfs" --size=10000 --name=lv_root '
+        '--vgname=vg00 --mkfsoptions="-d su=1024k,sw=8"']
+    # Volume sizes are rounded up to whole 8MB extents
+    assert 'logvol /var/cache/yum  --fstype="xfs" --size=2000 ' \
+        in dskobj.render_parts()
+    dskobj.tmp = 1001
+    dskobj.validate_parts()
+    assert 'logvol /tmp  --fstype="xfs" --size=1008 ' \
+        in dskobj.render_parts()
+    pv = part_lines(dskobj, 'part pv.21')[0]
+    assert int(pv.split('--size=')[1]) % 8 == 0
+
+
+MPATH_WWID = '3600508b400105e210000900000490000'
+MPATH_DEVICE = 'disk/by-id/dm-uuid-mpath-%s' % MPATH_WWID
+
+
+class FakePopen(object):
+    """ sfdisk -s on a host with sda and a LUN reachable over sde and sdf """
+    def __init__(self, args, stdout=None):
+        assert args == ['sfdisk', '-s']
+        self.stdout = io.StringIO(u'/dev/sda:  52428800\n'
+                                  u'/dev/sde: 104857600\n'
+                                  u'/dev/sdf: 104857600\n'
+                                  u'/dev/mapper/mpatha: 104857600\n'
+                                  u'total: 367001600 blocks\n')
+
+
+def test_multipath_info():
+    assert kspre.multipath_info() == {'dm-0': {'name': 'mpatha',
+                                               'wwid': MPATH_WWID,
+                                               'paths': ['sde', 'sdf'],
+                                               'size_mb': 102400}}
+
+
+def test_disk_info_lists_multipath_lun_once(monkeypatch):
+    monkeypatch.setattr(kspre.subprocess, 'Popen', FakePopen)
+    assert kspre.disk_info() == [
+        ('mpatha - 100.0 GB (2 paths)', (MPATH_DEVICE, 102400, 'dm-0')),
+        ('sda - 50.0 GB', ('sda', 51200, 'sda')),
+    ]
+
+
+def test_multipath_render_parts():
+    dskobj = kspre.DiskObject()
+    dskobj.set_disks([(MPATH_DEVICE, 102400, 'dm-0')])
+    dskobj.validate_parts()
+    assert dskobj.multipath['dm-0']['wwid'] == MPATH_WWID
+    assert part_lines(dskobj, 'ignoredisk') == [
+        'ignoredisk --only-use=%s' % MPATH_DEVICE]
+    parts = part_lines(dskobj, 'part')
+    assert parts
+    for line in parts:
+        assert '--ondisk=%s ' % MPATH_DEVICE in line
+
+
+def disks(*avail_mb):
+    # Identical 512e disks, sdb, sdc... only change the space available
+    dskobj = kspre.DiskObject()
+    dskobj.set_disks([('sd%s' % chr(ord('b') + i), mb, 'sda')
+                      for i, mb in enumerate(avail_mb)])
+    return dskobj
+
+
+def test_validate_parts_equal_disks():
+    dskobj = disks(100000, 100000, 100000)
+    assert dskobj.validate_parts() is False
+    # 25000MB of vg00 volumes and 4000MB of /var + 1% overhead, split in 3
+    assert dskobj.pv_mb == 8417
+    assert dskobj.raid_mb == 1347
+    assert dskobj.required_mb == 500 + 3 * (8417 + 1347)
+    assert dskobj.diskdiff == 100000 - 500 - 8417 - 1347
+
+
+def test_validate_parts_unequal_disks():
+    dskobj = disks(100000, 30000, 60000)
+    assert dskobj.validate_parts() is False
+    assert dskobj.pv_mb == 8417
+    assert dskobj.raid_mb == 1347
+    assert dskobj.diskdiff == 30000 - 8417 - 1347
+
+
+def test_validate_parts_boot_disk_smallest_after_boot():
+    # The first disk is larger, but has the least space left after /boot
+    dskobj = disks(30200, 30000)
+    assert dskobj.validate_parts() is False
+    assert dskobj.pv_mb == 12625
+    assert dskobj.raid_mb == 2020
+    assert dskobj.required_mb == 500 + 2 * (12625 + 2020)
+    assert dskobj.diskdiff == 30200 - 500 - 12625 - 2020
+
+
+def test_validate_parts_disk_too_small():
+    dskobj = disks(100000, 10000)
+    assert dskobj.validate_parts() is True
+    assert dskobj.diskdiff == 10000 - 12625 - 2020
+
+
+def test_stripe_pv_names_unique():
+    dskobj = disks(*[100000] * 12)
+    dskobj.validate_parts()
+    names = [line.split()[1] for line in part_lines(dskobj, 'part')
+             if line.split()[1].startswith('pv.')]
+    names += [line.split()[1] for line in part_lines(dskobj, 'raid')]
+    assert len(names) == 13
+    assert len(set(names)) == 13
+    assert part_lines(dskobj, 'volgroup vg01') == [
+        'volgroup vg01 --pesize=4096 pv.stripe']